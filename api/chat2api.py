@@ -1,12 +1,13 @@
 import asyncio
-import os
+import hashlib
 import types
+from pathlib import Path
 from typing import Optional
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from fastapi import Request, HTTPException, Form, Security
+from fastapi import Request, HTTPException, Form, Security, Query
 
-from fastapi.responses import HTMLResponse, StreamingResponse, JSONResponse
+from fastapi.responses import HTMLResponse, StreamingResponse, ORJSONResponse, Response
 from fastapi.security import HTTPAuthorizationCredentials
 from pydantic import BaseModel
 from starlette.background import BackgroundTask
@@ -22,8 +23,10 @@ from chatgpt.codexUsage import (
     update_token_config,
     delete_token_config,
     get_all_token_configs,
+    get_token_config,
     get_token_name,
     get_expired_token_entries,
+    is_token_expired,
 )
 
 from utils.Logger import logger
@@ -31,6 +34,10 @@ from utils.configs import api_prefix, scheduled_refresh
 from utils.retry import async_retry
 
 scheduler = AsyncIOScheduler()
+route_prefix = f"/{api_prefix}" if api_prefix else ""
+
+_DASHBOARD_HTML = Path(__file__).resolve().parent.parent.joinpath("static", "codex_dashboard.html").read_bytes()
+_DASHBOARD_ETAG = f'"{hashlib.sha1(_DASHBOARD_HTML).hexdigest()}"'
 
 
 @app.on_event("startup")
@@ -39,7 +46,12 @@ async def app_start():
         scheduler.add_job(id='refresh', func=refresh_all_tokens, trigger='cron', hour=3, minute=0, day='*/2',
                           kwargs={'force_refresh': True})
         scheduler.start()
-        asyncio.get_event_loop().call_later(0, lambda: asyncio.create_task(refresh_all_tokens(force_refresh=False)))
+        asyncio.create_task(refresh_all_tokens(force_refresh=False))
+
+
+@app.on_event("shutdown")
+async def app_shutdown():
+    await globals.flush_error_log()
 
 
 async def to_send_conversation(request_data, req_token):
@@ -64,7 +76,7 @@ async def process(request_data, req_token):
     return chat_service, res
 
 
-@app.post(f"/{api_prefix}/v1/chat/completions" if api_prefix else "/v1/chat/completions")
+@app.post(f"{route_prefix}/v1/chat/completions")
 async def send_conversation(request: Request, credentials: HTTPAuthorizationCredentials = Security(security_scheme)):
     req_token = credentials.credentials
     try:
@@ -78,7 +90,7 @@ async def send_conversation(request: Request, credentials: HTTPAuthorizationCred
             return StreamingResponse(res, media_type="text/event-stream", background=background)
         else:
             background = BackgroundTask(chat_service.close_client)
-            return JSONResponse(res, media_type="application/json", background=background)
+            return ORJSONResponse(res, background=background)
     except HTTPException as e:
         await chat_service.close_client()
         if e.status_code == 500:
@@ -91,54 +103,47 @@ async def send_conversation(request: Request, credentials: HTTPAuthorizationCred
         raise HTTPException(status_code=500, detail="Server error")
 
 
-@app.get(f"/{api_prefix}/tokens" if api_prefix else "/tokens", response_class=HTMLResponse)
+@app.get(f"{route_prefix}/tokens", response_class=HTMLResponse)
 async def upload_html(request: Request):
-    tokens_count = len(set(globals.token_list) - set(globals.error_token_list))
+    tokens_count = globals.active_tokens_count()
     return templates.TemplateResponse("tokens.html",
                                       {"request": request, "api_prefix": api_prefix, "tokens_count": tokens_count})
 
 
-@app.post(f"/{api_prefix}/tokens/upload" if api_prefix else "/tokens/upload")
-async def upload_post(text: str = Form(...)):
-    lines = text.split("\n")
-    for line in lines:
-        if line.strip() and not line.startswith("#"):
-            globals.token_list.append(line.strip())
-            with open(globals.TOKENS_FILE, "a", encoding="utf-8") as f:
-                f.write(line.strip() + "\n")
-    logger.info(f"Token count: {len(globals.token_list)}, Error token count: {len(globals.error_token_list)}")
-    tokens_count = len(set(globals.token_list) - set(globals.error_token_list))
-    return {"status": "success", "tokens_count": tokens_count}
+def _tokens_count_response(tokens_count: int):
+    return Response(content=f'{{"status":"success","tokens_count":{tokens_count}}}', media_type="application/json")
 
 
-@app.post(f"/{api_prefix}/tokens/clear" if api_prefix else "/tokens/clear")
-async def clear_tokens():
-    globals.token_list.clear()
-    globals.error_token_list.clear()
-    with open(globals.TOKENS_FILE, "w", encoding="utf-8") as f:
-        pass
-    logger.info(f"Token count: {len(globals.token_list)}, Error token count: {len(globals.error_token_list)}")
-    tokens_count = len(set(globals.token_list) - set(globals.error_token_list))
-    return {"status": "success", "tokens_count": tokens_count}
+# Orders in-memory token list changes with their token file writes, so a clear cannot be overtaken by an earlier append.
+_tokens_file_lock = asyncio.Lock()
 
 
-def _deduplicate_keep_order(items):
-    seen = set()
-    result = []
-    for item in items:
-        if item in seen:
-            continue
-        seen.add(item)
-        result.append(item)
-    return result
+@app.post(f"{route_prefix}/tokens/upload")
+async def upload_post(text: str = Form(...)):
+    cleaned = []
+    for line in text.split("\n"):
+        token = line.strip()
+        if token and not token.startswith("#"):
+            cleaned.append(token)
+    if cleaned:
+        async with _tokens_file_lock:
+            globals.add_runtime_tokens(cleaned)
+            await asyncio.to_thread(globals.write_text, globals.TOKENS_FILE, "\n".join(cleaned) + "\n", "a")
+    logger.info(f"Token count: {len(globals.token_list)}, Error token count: {len(globals.error_token_list)}")
+    tokens_count = globals.active_tokens_count()
+    return _tokens_count_response(tokens_count)
 
 
-def _persist_error_tokens():
-    unique_tokens = _deduplicate_keep_order(globals.error_token_list)
-    globals.error_token_list[:] = unique_tokens
-    with open(globals.ERROR_TOKENS_FILE, "w", encoding="utf-8") as f:
-        for token in unique_tokens:
-            f.write(token + "\n")
+@app.post(f"{route_prefix}/tokens/clear")
+async def clear_tokens():
+    global _last_expired_state
+    async with _reconcile_lock, _tokens_file_lock:
+        globals.clear_runtime_tokens()
+        _last_expired_state = None
+        await asyncio.to_thread(globals.write_text, globals.TOKENS_FILE, "", "w")
+    logger.info(f"Token count: {len(globals.token_list)}, Error token count: {len(globals.error_token_list)}")
+    tokens_count = globals.active_tokens_count()
+    return _tokens_count_response(tokens_count)
 
 
 def _build_error_token_item(token: str):
@@ -150,47 +155,53 @@ def _build_error_token_item(token: str):
     }
 
 
-def _ensure_token_present_in_runtime(token: str):
-    if token not in globals.token_list:
-        globals.token_list.append(token)
-        with open(globals.TOKENS_FILE, "a", encoding="utf-8") as f:
-            f.write(token + "\n")
+async def _ensure_token_present_in_runtime(token: str):
+    async with _tokens_file_lock:
+        if token not in globals.token_set:
+            globals.add_runtime_tokens([token])
+            await asyncio.to_thread(globals.write_text, globals.TOKENS_FILE, token + "\n", "a")
+
 
+_last_expired_state: Optional[frozenset] = None
+_reconcile_lock = asyncio.Lock()
 
-def _reconcile_expired_tokens():
-    expired_entries = get_expired_token_entries()
-    changed = False
-    for _, cfg in expired_entries.items():
-        token = str(cfg.get("full_token") or "").strip()
-        if not token:
-            continue
-        _ensure_token_present_in_runtime(token)
-        if token not in globals.error_token_list:
-            globals.error_token_list.append(token)
-            changed = True
 
-    if changed:
-        _persist_error_tokens()
+async def _reconcile_expired_tokens():
+    global _last_expired_state
+    async with _reconcile_lock:
+        expired_entries = get_expired_token_entries()
+        state = frozenset((key, cfg.get("full_token")) for key, cfg in expired_entries.items())
+        if state == _last_expired_state:
+            return
+
+        for _, cfg in expired_entries.items():
+            token = str(cfg.get("full_token") or "").strip()
+            if not token:
+                continue
+            await _ensure_token_present_in_runtime(token)
+            if globals.add_runtime_error_token(token):
+                globals.log_error_token("+", token)
+        _last_expired_state = state
 
 
 def _restore_token_from_error_pool_if_not_expired(token_key: str):
-    cfg = get_all_token_configs().get(token_key)
+    cfg = get_token_config(token_key)
     if not cfg:
         return
     token = str(cfg.get("full_token") or "").strip()
     if not token:
         return
 
-    expired_keys = set(get_expired_token_entries().keys())
-    if token_key not in expired_keys and token in globals.error_token_list:
-        globals.error_token_list[:] = [t for t in globals.error_token_list if t != token]
-        _persist_error_tokens()
+    if not is_token_expired(token_key) and globals.remove_runtime_error_token(token):
+        globals.log_error_token("-", token)
 
 
-@app.post(f"/{api_prefix}/tokens/error" if api_prefix else "/tokens/error")
-async def error_tokens():
-    _reconcile_expired_tokens()
-    error_tokens_list = _deduplicate_keep_order(globals.error_token_list)
+@app.post(f"{route_prefix}/tokens/error")
+async def error_tokens(include_details: bool = Query(False)):
+    await _reconcile_expired_tokens()
+    error_tokens_list = list(globals.error_token_list)
+    if not include_details:
+        return {"status": "success", "error_tokens": error_tokens_list}
     data = [_build_error_token_item(token) for token in error_tokens_list]
     return {"status": "success", "error_tokens": error_tokens_list, "data": data}
 
@@ -199,22 +210,18 @@ class ErrorTokenRequest(BaseModel):
     token: str
 
 
-@app.post(f"/{api_prefix}/tokens/error/add" if api_prefix else "/tokens/error/add")
+@app.post(f"{route_prefix}/tokens/error/add")
 async def add_error_token(req: ErrorTokenRequest):
     token = req.token.strip()
     if not token or token.startswith("#"):
         raise HTTPException(status_code=400, detail="Invalid token")
 
-    if token not in globals.token_list:
-        globals.token_list.append(token)
-        with open(globals.TOKENS_FILE, "a", encoding="utf-8") as f:
-            f.write(token + "\n")
+    await _ensure_token_present_in_runtime(token)
 
-    if token not in globals.error_token_list:
-        globals.error_token_list.append(token)
-        _persist_error_tokens()
+    if globals.add_runtime_error_token(token):
+        globals.log_error_token("+", token)
 
-    tokens_count = len(set(globals.token_list) - set(globals.error_token_list))
+    tokens_count = globals.active_tokens_count()
     return {
         "status": "success",
         "tokens_count": tokens_count,
@@ -222,17 +229,19 @@ async def add_error_token(req: ErrorTokenRequest):
     }
 
 
-@app.post(f"/{api_prefix}/tokens/error/remove" if api_prefix else "/tokens/error/remove")
+@app.post(f"{route_prefix}/tokens/error/remove")
 async def remove_error_token(req: ErrorTokenRequest):
+    global _last_expired_state
     token = req.token.strip()
     if not token:
         raise HTTPException(status_code=400, detail="Invalid token")
 
-    if token in globals.error_token_list:
-        globals.error_token_list[:] = [t for t in globals.error_token_list if t != token]
-        _persist_error_tokens()
+    async with _reconcile_lock:
+        if globals.remove_runtime_error_token(token):
+            _last_expired_state = None
+            globals.log_error_token("-", token)
 
-    tokens_count = len(set(globals.token_list) - set(globals.error_token_list))
+    tokens_count = globals.active_tokens_count()
     return {
         "status": "success",
         "tokens_count": tokens_count,
@@ -240,26 +249,26 @@ async def remove_error_token(req: ErrorTokenRequest):
     }
 
 
-@app.get(f"/{api_prefix}/tokens/add/{{token}}" if api_prefix else "/tokens/add/{token}")
+@app.get(f"{route_prefix}/tokens/add/{{token}}")
 async def add_token(token: str):
-
-    if token.strip() and not token.startswith("#"):
-        globals.token_list.append(token.strip())
-        with open(globals.TOKENS_FILE, "a", encoding="utf-8") as f:
-            f.write(token.strip() + "\n")
+    token = token.strip()
+    if token and not token.startswith("#"):
+        async with _tokens_file_lock:
+            globals.add_runtime_tokens([token])
+            await asyncio.to_thread(globals.write_text, globals.TOKENS_FILE, token + "\n", "a")
     logger.info(f"Token count: {len(globals.token_list)}, Error token count: {len(globals.error_token_list)}")
-    tokens_count = len(set(globals.token_list) - set(globals.error_token_list))
-    return {"status": "success", "tokens_count": tokens_count}
+    tokens_count = globals.active_tokens_count()
+    return _tokens_count_response(tokens_count)
 
 
-@app.post(f"/{api_prefix}/seed_tokens/clear" if api_prefix else "/seed_tokens/clear")
+@app.post(f"{route_prefix}/seed_tokens/clear")
 async def clear_seed_tokens():
     globals.seed_map.clear()
     globals.conversation_map.clear()
-    with open(globals.SEED_MAP_FILE, "w", encoding="utf-8") as f:
-        f.write("{}")
-    with open(globals.CONVERSATION_MAP_FILE, "w", encoding="utf-8") as f:
-        f.write("{}")
+    await asyncio.gather(
+        asyncio.to_thread(globals.write_text, globals.SEED_MAP_FILE, "{}", "w"),
+        asyncio.to_thread(globals.write_text, globals.CONVERSATION_MAP_FILE, "{}", "w"),
+    )
     logger.info(f"Seed token count: {len(globals.seed_map)}")
     return {"status": "success", "seed_tokens_count": len(globals.seed_map)}
 
@@ -275,17 +284,16 @@ class TokenRenameRequest(BaseModel):
     expires_at: Optional[str] = None
 
 
-@app.get(f"/{api_prefix}/codex/usage/{{token_prefix}}" if api_prefix else "/codex/usage/{token_prefix}")
+@app.get(f"{route_prefix}/codex/usage/{{token_prefix}}")
 async def get_token_codex_usage(token_prefix: str):
-    _reconcile_expired_tokens()
+    await _reconcile_expired_tokens()
     snapshot = get_codex_snapshot(token_prefix)
+    cfg = get_token_config(token_prefix)
     if snapshot:
-        cfg = get_all_token_configs().get(token_prefix, {})
-        snapshot["token_name"] = get_token_name(token_prefix) or ""
-        snapshot["expires_at"] = cfg.get("expires_at")
+        snapshot["token_name"] = (cfg or {}).get("name") or ""
+        snapshot["expires_at"] = (cfg or {}).get("expires_at")
         return {"status": "success", "data": snapshot}
 
-    cfg = get_all_token_configs().get(token_prefix)
     if cfg:
         return {
             "status": "success",
@@ -299,71 +307,68 @@ async def get_token_codex_usage(token_prefix: str):
 
 
 
-@app.get(f"/{api_prefix}/codex/runtime_tokens/stats" if api_prefix else "/codex/runtime_tokens/stats")
+@app.get(f"{route_prefix}/codex/runtime_tokens/stats")
 async def get_runtime_tokens_stats():
-    tokens_count = len(set(globals.token_list) - set(globals.error_token_list))
-    return {
-        "status": "success",
-        "tokens_count": tokens_count,
-        "token_list_count": len(globals.token_list),
-        "error_token_count": len(globals.error_token_list),
-    }
+    tokens_count = globals.active_tokens_count()
+    return Response(
+        content=f'{{"status":"success","tokens_count":{tokens_count},'
+                f'"token_list_count":{len(globals.token_list)},"error_token_count":{len(globals.error_token_list)}}}',
+        media_type="application/json",
+    )
 
 
-@app.get(f"/{api_prefix}/codex/usage" if api_prefix else "/codex/usage")
+@app.get(f"{route_prefix}/codex/usage")
 async def get_all_codex_usage():
-    _reconcile_expired_tokens()
+    await _reconcile_expired_tokens()
     return {"status": "success", "data": get_all_codex_snapshots_with_names()}
 
 
 
-@app.post(f"/{api_prefix}/codex/tokens" if api_prefix else "/codex/tokens")
+@app.post(f"{route_prefix}/codex/tokens")
 async def create_token_config(req: TokenConfigRequest):
     token = req.token.strip()
+    name = req.name.strip()
     if not token or token.startswith("#"):
         raise HTTPException(status_code=400, detail="Invalid token")
 
-    if token not in globals.token_list:
-        globals.token_list.append(token)
-        with open(globals.TOKENS_FILE, "a", encoding="utf-8") as f:
-            f.write(token + "\n")
+    await _ensure_token_present_in_runtime(token)
 
     try:
-        token_key = add_token_config(token, req.name.strip(), req.expires_at)
+        token_key = add_token_config(token, name, req.expires_at)
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc))
 
-    _reconcile_expired_tokens()
+    await _reconcile_expired_tokens()
 
-    tokens_count = len(set(globals.token_list) - set(globals.error_token_list))
+    tokens_count = globals.active_tokens_count()
     return {
         "status": "success",
         "token_key": token_key,
-        "name": req.name.strip(),
-        "expires_at": get_all_token_configs().get(token_key, {}).get("expires_at"),
+        "name": name,
+        "expires_at": (get_token_config(token_key) or {}).get("expires_at"),
         "tokens_count": tokens_count,
     }
 
 
-@app.get(f"/{api_prefix}/codex/tokens" if api_prefix else "/codex/tokens")
+@app.get(f"{route_prefix}/codex/tokens")
 async def list_token_configs():
     return {"status": "success", "data": get_all_token_configs()}
 
 
-@app.put(f"/{api_prefix}/codex/tokens/{{token_key}}" if api_prefix else "/codex/tokens/{token_key}")
+@app.put(f"{route_prefix}/codex/tokens/{{token_key}}")
 async def rename_token_config(token_key: str, req: TokenRenameRequest):
     ok = update_token_config(token_key, req.name, req.expires_at)
     if ok:
-        _reconcile_expired_tokens()
+        await _reconcile_expired_tokens()
         _restore_token_from_error_pool_if_not_expired(token_key)
         return {
             "status": "success",
-            "data": get_all_token_configs().get(token_key, {}),
+            "data": get_token_config(token_key) or {},
         }
     return {"status": "not_found", "message": "Token not found"}
 
 
-@app.delete(f"/{api_prefix}/codex/tokens/{{token_key}}" if api_prefix else "/codex/tokens/{token_key}")
+@app.delete(f"{route_prefix}/codex/tokens/{{token_key}}")
 async def remove_token_config(token_key: str):
     ok = delete_token_config(token_key)
     if ok:
@@ -371,8 +376,8 @@ async def remove_token_config(token_key: str):
     return {"status": "not_found", "message": "Token not found"}
 
 
-@app.get(f"/{api_prefix}/codex/dashboard" if api_prefix else "/codex/dashboard", response_class=HTMLResponse)
-async def codex_dashboard():
-    html_path = os.path.join(os.path.dirname(__file__), "..", "static", "codex_dashboard.html")
-    with open(html_path, "r", encoding="utf-8") as f:
-        return HTMLResponse(content=f.read())
\ No newline at end of file
+@app.get(f"{route_prefix}/codex/dashboard", response_class=HTMLResponse)
+async def codex_dashboard(request: Request):
+    if request.headers.get("if-none-match") == _DASHBOARD_ETAG:
+        return Response(status_code=304, headers={"ETag": _DASHBOARD_ETAG})
+    return HTMLResponse(content=_DASHBOARD_HTML, headers={"ETag": _DASHBOARD_ETAG})
@@ -4,6 +4,7 @@ import uvicorn
 from fastapi import FastAPI, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.templating import Jinja2Templates
 
 from utils.configs import enable_gateway, api_prefix
@@ -20,7 +21,8 @@ log_config["formatters"]["access"]["fmt"] = access_format
 app = FastAPI(
     docs_url=f"/{api_prefix}/docs",    # 设置 Swagger UI 文档路径
     redoc_url=f"/{api_prefix}/redoc",  # 设置 Redoc 文档路径
-    openapi_url=f"/{api_prefix}/openapi.json"  # 设置 OpenAPI JSON 路径
+    openapi_url=f"/{api_prefix}/openapi.json",  # 设置 OpenAPI JSON 路径
+    default_response_class=ORJSONResponse
 )
 
 app.add_middleware(
@@ -3,6 +3,7 @@ import hashlib
 import json
 import random
 import uuid
+from functools import lru_cache
 
 from fastapi import HTTPException
 from starlette.concurrency import run_in_threadpool
@@ -33,6 +34,53 @@ from utils.configs import (
 )
 
 
+@lru_cache(maxsize=256)
+def resolve_model(origin_model):
+    resp_model = model_proxy.get(origin_model, origin_model)
+    if "gizmo" in origin_model or "g-" in origin_model:
+        gizmo_id = "g-" + origin_model.split("g-")[-1]
+    else:
+        gizmo_id = None
+
+    if "o3-mini-high" in origin_model:
+        req_model = "o3-mini-high"
+    elif "o3-mini-medium" in origin_model:
+        req_model = "o3-mini-medium"
+    elif "o3-mini-low" in origin_model:
+        req_model = "o3-mini-low"
+    elif "o3-mini" in origin_model:
+        req_model = "o3-mini"
+    elif "o3" in origin_model:
+        req_model = "o3"
+    elif "o1-preview" in origin_model:
+        req_model = "o1-preview"
+    elif "o1-pro" in origin_model:
+        req_model = "o1-pro"
+    elif "o1-mini" in origin_model:
+        req_model = "o1-mini"
+    elif "o1" in origin_model:
+        req_model = "o1"
+    elif "gpt-4.5o" in origin_model:
+        req_model = "gpt-4.5o"
+    elif "gpt-4o-canmore" in origin_model:
+        req_model = "gpt-4o-canmore"
+    elif "gpt-4o-mini" in origin_model:
+        req_model = "gpt-4o-mini"
+    elif "gpt-4o" in origin_model:
+        req_model = "gpt-4o"
+    elif "gpt-4-mobile" in origin_model:
+        req_model = "gpt-4-mobile"
+    elif "gpt-4" in origin_model:
+        req_model = "gpt-4"
+    elif "gpt-3.5" in origin_model:
+        req_model = "text-davinci-002-render-sha"
+    elif "auto" in origin_model:
+        req_model = "auto"
+    else:
+        req_model = "gpt-4o"
+    return resp_model, gizmo_id, req_model
+
+
 class ChatService:
     def __init__(self, origin_token=None):
         # self.user_agent = random.choice(user_agents_list) if user_agents_list else "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/127.0.0.0 Safari/537.36"
@@ -135,48 +183,7 @@ class ChatService:
 
     async def set_model(self):
         self.origin_model = self.data.get("model", "gpt-3.5-turbo-0125")
-        self.resp_model = model_proxy.get(self.origin_model, self.origin_model)
-        if "gizmo" in self.origin_model or "g-" in self.origin_model:
-            self.gizmo_id = "g-" + self.origin_model.split("g-")[-1]
-        else:
-            self.gizmo_id = None
-
-        if "o3-mini-high" in self.origin_model:
-            self.req_model = "o3-mini-high"
-        elif "o3-mini-medium" in self.origin_model:
-            self.req_model = "o3-mini-medium"
-        elif "o3-mini-low" in self.origin_model:
-            self.req_model = "o3-mini-low"
-        elif "o3-mini" in self.origin_model:
-            self.req_model = "o3-mini"
-        elif "o3" in self.origin_model:
-            self.req_model = "o3"
-        elif "o1-preview" in self.origin_model:
-            self.req_model = "o1-preview"
-        elif "o1-pro" in self.origin_model:
-            self.req_model = "o1-pro"
-        elif "o1-mini" in self.origin_model:
-            self.req_model = "o1-mini"
-        elif "o1" in self.origin_model:
-            self.req_model = "o1"
-        elif "gpt-4.5o" in self.origin_model:
-            self.req_model = "gpt-4.5o"
-        elif "gpt-4o-canmore" in self.origin_model:
-            self.req_model = "gpt-4o-canmore"
-        elif "gpt-4o-mini" in self.origin_model:
-            self.req_model = "gpt-4o-mini"
-        elif "gpt-4o" in self.origin_model:
-            self.req_model = "gpt-4o"
-        elif "gpt-4-mobile" in self.origin_model:
-            self.req_model = "gpt-4-mobile"
-        elif "gpt-4" in self.origin_model:
-            self.req_model = "gpt-4"
-        elif "gpt-3.5" in self.origin_model:
-            self.req_model = "text-davinci-002-render-sha"
-        elif "auto" in self.origin_model:
-            self.req_model = "auto"
-        else:
-            self.req_model = "gpt-4o"
+        self.resp_model, self.gizmo_id, self.req_model = resolve_model(self.origin_model)
 
     async def get_chat_requirements(self):
         if conversation_only:
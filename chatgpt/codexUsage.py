@@ -1,23 +1,64 @@
-import json
+import atexit
+import heapq
+import math
 import os
+import threading
+import time
 from datetime import datetime, timezone
-from typing import Optional, Dict, Any
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Optional, Dict, Any, List, Mapping, Set, Tuple
+
+import orjson
+
+from utils.Logger import logger
 
 
 CODEX_USAGE_FILE = os.path.join("data", "codex_usage.json")
 TOKEN_CONFIG_FILE = os.path.join("data", "token_config.json")
-
-_codex_usage_map: Dict[str, Dict[str, Any]] = {}
-_token_config_map: Dict[str, Dict[str, Any]] = {}
+CODEX_USAGE_LOG_FILE = os.path.join("data", "codex_usage.log")
+TOKEN_CONFIG_DELETIONS_FILE = os.path.join("data", "token_config_deletions.log")
+
+_FLUSH_DELAY_SECONDS = 0.25
+_USAGE_LOG_COMPACT_FACTOR = 4
+_DELETION_LOG_COMPACT_LINES = 32
+
+# 首次访问时才从磁盘加载，见 _usage() / _cfg()
+_codex_usage_map: Optional[Dict[str, Dict[str, Any]]] = None
+_token_config_map: Optional[Dict[str, Dict[str, Any]]] = None
+_init_lock = threading.Lock()
+_expires_at_epoch: Dict[str, float] = {}
+_expiry_heap: List[Tuple[float, str]] = []
+_expired_keys: Set[str] = set()
 _UNSET = object()
+_now_iso_cache = (0, "")
+
+_dirty_event = threading.Event()
+_dirty_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_codex_usage_dirty_keys = set()
+_codex_usage_log_lines = 0
+_codex_usage_compact_required = False
+_token_config_dirty = False
+_token_config_deletions: List[Tuple[str, float]] = []
+_token_config_deletion_lines = 0
 
 
 def _normalize_expires_at(expires_at: Optional[str]) -> Optional[str]:
 
     if expires_at is None:
         return None
+    if isinstance(expires_at, str):
+        value = expires_at
+        if value[:1].isspace() or value[-1:].isspace():
+            value = value.strip()
+    else:
+        value = str(expires_at).strip()
+    return _normalize_expires_at_text(value)
+
 
-    value = str(expires_at).strip()
+@lru_cache(maxsize=4096)
+def _normalize_expires_at_text(value: str) -> Optional[str]:
     if not value:
         return None
 
@@ -35,6 +76,17 @@ def _normalize_expires_at(expires_at: Optional[str]) -> Optional[str]:
     return dt.isoformat()
 
 
+def _now_iso() -> str:
+    """当前 UTC 时间的 isoformat，按秒缓存。"""
+    global _now_iso_cache
+    now_s = int(time.time())
+    cached_s, cached_iso = _now_iso_cache
+    if now_s != cached_s:
+        cached_iso = datetime.fromtimestamp(now_s, timezone.utc).isoformat()
+        _now_iso_cache = (now_s, cached_iso)
+    return cached_iso
+
+
 def _ensure_data_dir():
     os.makedirs("data", exist_ok=True)
 
@@ -43,8 +95,8 @@ def _load_json_file(path: str) -> Dict[str, Any]:
     if not os.path.exists(path):
         return {}
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        with open(path, "rb") as f:
+            data = orjson.loads(f.read())
             return data if isinstance(data, dict) else {}
     except Exception:
         return {}
@@ -52,67 +104,81 @@ def _load_json_file(path: str) -> Dict[str, Any]:
 
 def _persist_json_file(path: str, data: Dict[str, Any]):
     _ensure_data_dir()
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    payload = orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
 
 
-def _parse_float(headers: Dict[str, Any], key: str) -> Optional[float]:
-    value = headers.get(key)
+def _parse_float(value: Any) -> Optional[float]:
     if value is None:
         return None
+    if isinstance(value, str) and value.removeprefix("-").replace(".", "", 1).isdecimal():
+        return float(value)
     try:
         return float(value)
     except Exception:
         return None
 
 
-def _parse_int(headers: Dict[str, Any], key: str) -> Optional[int]:
-    value = headers.get(key)
+def _parse_int(value: Any) -> Optional[int]:
     if value is None:
         return None
+    if isinstance(value, str) and value.removeprefix("-").isdecimal():
+        return int(value)
     try:
         return int(value)
     except Exception:
         return None
 
 
+# 小写响应头 -> (快照字段, 解析函数)
+_CODEX_HEADER_FIELDS = {
+    "x-codex-primary-used-percent": ("primary_used_percent", _parse_float),
+    "x-codex-primary-reset-after-seconds": ("primary_reset_after_seconds", _parse_int),
+    "x-codex-primary-window-minutes": ("primary_window_minutes", _parse_int),
+    "x-codex-secondary-used-percent": ("secondary_used_percent", _parse_float),
+    "x-codex-secondary-reset-after-seconds": ("secondary_reset_after_seconds", _parse_int),
+    "x-codex-secondary-window-minutes": ("secondary_window_minutes", _parse_int),
+    "x-codex-primary-over-secondary-limit-percent": ("primary_over_secondary_percent", _parse_float),
+}
+
+
 def extract_codex_usage_headers(headers: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     """从上游响应头提取 x-codex-* 字段。"""
-    normalized_headers = {str(k).lower(): v for k, v in headers.items()}
     snapshot: Dict[str, Any] = {}
-    has_data = False
-
-    if (v := _parse_float(normalized_headers, "x-codex-primary-used-percent")) is not None:
-        snapshot["primary_used_percent"] = v
-        has_data = True
-    if (v := _parse_int(normalized_headers, "x-codex-primary-reset-after-seconds")) is not None:
-        snapshot["primary_reset_after_seconds"] = v
-        has_data = True
-    if (v := _parse_int(normalized_headers, "x-codex-primary-window-minutes")) is not None:
-        snapshot["primary_window_minutes"] = v
-        has_data = True
-
-    if (v := _parse_float(normalized_headers, "x-codex-secondary-used-percent")) is not None:
-        snapshot["secondary_used_percent"] = v
-        has_data = True
-    if (v := _parse_int(normalized_headers, "x-codex-secondary-reset-after-seconds")) is not None:
-        snapshot["secondary_reset_after_seconds"] = v
-        has_data = True
-    if (v := _parse_int(normalized_headers, "x-codex-secondary-window-minutes")) is not None:
-        snapshot["secondary_window_minutes"] = v
-        has_data = True
-
-    if (v := _parse_float(normalized_headers, "x-codex-primary-over-secondary-limit-percent")) is not None:
-        snapshot["primary_over_secondary_percent"] = v
-        has_data = True
-
-    if not has_data:
+    remaining = len(_CODEX_HEADER_FIELDS)
+    for key, value in headers.items():
+        key = str(key)
+        entry = _CODEX_HEADER_FIELDS.get(key if key.islower() else key.lower())
+        if entry is None:
+            continue
+        field, parse = entry
+        if (v := parse(value)) is not None:
+            snapshot[field] = v
+        remaining -= 1
+        if not remaining:
+            break
+
+    if not snapshot:
         return None
 
-    snapshot["updated_at"] = datetime.now(timezone.utc).isoformat()
+    snapshot["updated_at"] = _now_iso()
     return snapshot
 
 
+_WINDOW_SUFFIXES = ("used_percent", "reset_after_seconds", "window_minutes")
+# _WINDOW_KEY_PAIRS[(源窗口, 目标窗口)] = ((源字段, 目标字段), ...)
+_WINDOW_KEY_PAIRS = {
+    (src, dst): tuple((f"{src}_{suffix}", f"codex_{dst}_{suffix}") for suffix in _WINDOW_SUFFIXES)
+    for src in ("primary", "secondary")
+    for dst in ("5h", "7d")
+}
+
+
 def normalize_codex_windows(snapshot: Dict[str, Any]) -> Dict[str, Any]:
     """将 primary/secondary 窗口标准化映射为 5h/7d 字段。"""
     result = dict(snapshot)
@@ -120,107 +186,102 @@ def normalize_codex_windows(snapshot: Dict[str, Any]) -> Dict[str, Any]:
     primary_window = snapshot.get("primary_window_minutes")
     secondary_window = snapshot.get("secondary_window_minutes")
 
-    use_5h_from_primary = False
-    use_7d_from_primary = False
-    use_5h_from_secondary = False
-    use_7d_from_secondary = False
-
     if primary_window is not None and secondary_window is not None:
         if primary_window < secondary_window:
-            use_5h_from_primary = True
-            use_7d_from_secondary = True
+            src_5h, src_7d = "primary", "secondary"
         else:
-            use_5h_from_secondary = True
-            use_7d_from_primary = True
+            src_5h, src_7d = "secondary", "primary"
     elif primary_window is not None:
-        if primary_window <= 360:
-            use_5h_from_primary = True
-        else:
-            use_7d_from_primary = True
+        src_5h, src_7d = ("primary", None) if primary_window <= 360 else (None, "primary")
     elif secondary_window is not None:
-        if secondary_window <= 360:
-            use_5h_from_secondary = True
-        else:
-            use_7d_from_secondary = True
+        src_5h, src_7d = ("secondary", None) if secondary_window <= 360 else (None, "secondary")
     else:
-        use_5h_from_secondary = True
-        use_7d_from_primary = True
-
-    src_5h = "primary" if use_5h_from_primary else ("secondary" if use_5h_from_secondary else None)
-    src_7d = "primary" if use_7d_from_primary else ("secondary" if use_7d_from_secondary else None)
+        src_5h, src_7d = "secondary", "primary"
 
     if src_5h:
-        for suffix in ["used_percent", "reset_after_seconds", "window_minutes"]:
-            key = f"{src_5h}_{suffix}"
-            if key in snapshot:
-                result[f"codex_5h_{suffix}"] = snapshot[key]
+        for src_key, dst_key in _WINDOW_KEY_PAIRS[(src_5h, "5h")]:
+            if src_key in snapshot:
+                result[dst_key] = snapshot[src_key]
 
     if src_7d:
-        for suffix in ["used_percent", "reset_after_seconds", "window_minutes"]:
-            key = f"{src_7d}_{suffix}"
-            if key in snapshot:
-                result[f"codex_7d_{suffix}"] = snapshot[key]
+        for src_key, dst_key in _WINDOW_KEY_PAIRS[(src_7d, "7d")]:
+            if src_key in snapshot:
+                result[dst_key] = snapshot[src_key]
 
     return result
 
 
 def update_codex_snapshot(token_key: str, snapshot: Dict[str, Any]):
     normalized = normalize_codex_windows(snapshot)
-    _codex_usage_map[token_key] = normalized
-    _persist_codex_usage()
+    _usage()[token_key] = normalized
+    _persist_codex_usage(token_key)
 
 
 def get_codex_snapshot(token_key: str) -> Optional[Dict[str, Any]]:
-    data = _codex_usage_map.get(token_key)
+    data = _usage().get(token_key)
     return dict(data) if data else None
 
 
-def get_all_codex_snapshots() -> Dict[str, Dict[str, Any]]:
-    return {k: dict(v) for k, v in _codex_usage_map.items()}
+def get_all_codex_snapshots() -> Dict[str, Mapping[str, Any]]:
+    """返回只读视图，调用方需要修改时请自行 dict() 复制。"""
+    return {k: MappingProxyType(v) for k, v in _usage().items()}
 
 
 def add_token_config(full_token: str, name: str, expires_at: Optional[str] = None) -> str:
     token_key = full_token[:20]
     normalized_expires_at = _normalize_expires_at(expires_at)
-    _token_config_map[token_key] = {
+    _cfg()[token_key] = {
         "name": name,
         "full_token": full_token,
+        # 保留微秒精度：删除墓碑按 time.time() 比较，同一秒内删除后重新添加的配置不能被旧墓碑误删
         "created_at": datetime.now(timezone.utc).isoformat(),
         "expires_at": normalized_expires_at,
     }
+    _set_expires_at_epoch(token_key, normalized_expires_at)
     _persist_token_config()
     return token_key
 
 
 def update_token_config(token_key: str, name: Optional[str] = None, expires_at: Any = _UNSET) -> bool:
-    if token_key not in _token_config_map:
+    config = _cfg().get(token_key)
+    if config is None:
         return False
 
     if name is not None:
-        _token_config_map[token_key]["name"] = name
+        config["name"] = name
     if expires_at is not _UNSET:
-        _token_config_map[token_key]["expires_at"] = _normalize_expires_at(expires_at)
+        normalized_expires_at = _normalize_expires_at(expires_at)
+        config["expires_at"] = normalized_expires_at
+        _set_expires_at_epoch(token_key, normalized_expires_at)
     _persist_token_config()
     return True
 
 
 def delete_token_config(token_key: str) -> bool:
-    if token_key not in _token_config_map:
+    configs = _cfg()
+    if token_key not in configs:
         return False
-    del _token_config_map[token_key]
-    _persist_token_config()
-
-    if token_key in _codex_usage_map:
-        del _codex_usage_map[token_key]
-        _persist_codex_usage()
+    del configs[token_key]
+    _set_expires_at_epoch(token_key, None)
+    _persist_token_config_deletion(token_key)
+
+    usage = _usage()
+    if token_key in usage:
+        del usage[token_key]
+        _persist_codex_usage(token_key)
     return True
 
 
 def _parse_iso_datetime(value: Any) -> Optional[datetime]:
     if value is None:
         return None
+    return _parse_iso_datetime_text(str(value))
+
+
+@lru_cache(maxsize=4096)
+def _parse_iso_datetime_text(text: str) -> Optional[datetime]:
     try:
-        text = str(value).strip()
+        text = text.strip()
         if not text:
             return None
         if text.endswith("Z"):
@@ -235,65 +296,256 @@ def _parse_iso_datetime(value: Any) -> Optional[datetime]:
         return None
 
 
+def _set_expires_at_epoch(token_key: str, expires_at: Optional[str]):
+    dt = _parse_iso_datetime(expires_at)
+    _expired_keys.discard(token_key)
+    if dt is None:
+        _expires_at_epoch.pop(token_key, None)
+        return
+    expires_ts = dt.timestamp()
+    _expires_at_epoch[token_key] = expires_ts
+    heapq.heappush(_expiry_heap, (expires_ts, token_key))
+    if len(_expiry_heap) > 2 * len(_expires_at_epoch) + 16:
+        _expiry_heap[:] = [(ts, key) for key, ts in _expires_at_epoch.items() if key not in _expired_keys]
+        heapq.heapify(_expiry_heap)
+
+
+def _rebuild_expires_at_epoch(configs: Dict[str, Dict[str, Any]]):
+    _expires_at_epoch.clear()
+    _expiry_heap.clear()
+    _expired_keys.clear()
+    for key, cfg in configs.items():
+        _set_expires_at_epoch(key, cfg.get("expires_at"))
+
+
 def is_token_expired(token_key: str, now: Optional[datetime] = None) -> bool:
-    config = _token_config_map.get(token_key)
-    if not config:
-        return False
-    expires_at = _parse_iso_datetime(config.get("expires_at"))
-    if expires_at is None:
-        return False
-    if now is None:
-        now = datetime.now(timezone.utc)
-    return now >= expires_at
+    _cfg()
+    now_ts = now.timestamp() if now else time.time()
+    return now_ts >= _expires_at_epoch.get(token_key, math.inf)
 
 
 def get_expired_token_entries(now: Optional[datetime] = None) -> Dict[str, Dict[str, Any]]:
-    current = now or datetime.now(timezone.utc)
-    result: Dict[str, Dict[str, Any]] = {}
-    for key, cfg in _token_config_map.items():
-        expires_at = _parse_iso_datetime(cfg.get("expires_at"))
-        if expires_at and current >= expires_at:
-            result[key] = dict(cfg)
-    return result
+    configs = _cfg()
+    now_ts = now.timestamp() if now else time.time()
+    # 堆中只保留尚未过期的条目；过期时间被修改后留下的旧条目在弹出时丢弃
+    while _expiry_heap and _expiry_heap[0][0] <= now_ts:
+        expires_ts, key = heapq.heappop(_expiry_heap)
+        if _expires_at_epoch.get(key) == expires_ts:
+            _expired_keys.add(key)
+    return {
+        key: dict(configs[key])
+        for key in _expired_keys
+        if now_ts >= _expires_at_epoch[key]
+    }
+
 
+def get_all_token_configs() -> Dict[str, Mapping[str, Any]]:
+    """返回只读视图，调用方需要修改时请自行 dict() 复制。"""
+    return {k: MappingProxyType(v) for k, v in _cfg().items()}
 
-def get_all_token_configs() -> Dict[str, Dict[str, Any]]:
-    return {k: dict(v) for k, v in _token_config_map.items()}
+
+def get_token_config(token_key: str) -> Optional[Dict[str, Any]]:
+    config = _cfg().get(token_key)
+    return dict(config) if config else None
 
 
 def get_token_name(token_key: str) -> Optional[str]:
-    config = _token_config_map.get(token_key)
+    config = _cfg().get(token_key)
     return config.get("name") if config else None
 
 
 def get_all_codex_snapshots_with_names() -> Dict[str, Dict[str, Any]]:
+    usage = _usage()
     result: Dict[str, Dict[str, Any]] = {}
-    all_keys = set(_codex_usage_map.keys()) | set(_token_config_map.keys())
-    for key in all_keys:
-        snapshot = dict(_codex_usage_map.get(key, {}))
-        token_cfg = _token_config_map.get(key, {})
+    for key, token_cfg in _cfg().items():
+        snapshot = dict(usage.get(key, ()))
         snapshot["token_name"] = token_cfg.get("name", "")
         snapshot["token_key"] = key
         result[key] = snapshot
+    for key, usage_snapshot in usage.items():
+        if key not in result:
+            snapshot = dict(usage_snapshot)
+            snapshot["token_name"] = ""
+            snapshot["token_key"] = key
+            result[key] = snapshot
     return result
 
 
-def _persist_codex_usage():
-    _persist_json_file(CODEX_USAGE_FILE, _codex_usage_map)
+def _flush_now():
+    """立即将标记为脏的数据写盘；写盘失败的部分重新标记为脏，由下次刷新重试。"""
+    global _codex_usage_dirty_keys, _codex_usage_compact_required, _token_config_dirty, _token_config_deletion_lines
+    with _flush_lock:
+        with _dirty_lock:
+            dirty_keys, _codex_usage_dirty_keys = _codex_usage_dirty_keys, set()
+            deletions = _token_config_deletions[:]
+            _token_config_deletions.clear()
+        if dirty_keys:
+            try:
+                _append_codex_usage_log(dirty_keys)
+            except Exception as e:
+                logger.error(f"Failed to persist {CODEX_USAGE_LOG_FILE}: {str(e)}")
+                # 追加失败可能留下半行记录，重试时直接压缩回快照文件
+                _codex_usage_compact_required = True
+                with _dirty_lock:
+                    _codex_usage_dirty_keys |= dirty_keys
+                _dirty_event.set()
+        if deletions and not _token_config_dirty:
+            try:
+                _append_token_config_deletions(deletions)
+            except Exception as e:
+                logger.error(f"Failed to persist {TOKEN_CONFIG_DELETIONS_FILE}: {str(e)}")
+                # 内存中配置已删除，改为整体重写配置文件，同时清掉可能残留的半行墓碑
+                _token_config_dirty = True
+        if _token_config_dirty:
+            _token_config_dirty = False
+            try:
+                _persist_json_file(TOKEN_CONFIG_FILE, _cfg())
+            except Exception as e:
+                logger.error(f"Failed to persist {TOKEN_CONFIG_FILE}: {str(e)}")
+                _token_config_dirty = True
+                _dirty_event.set()
+                return
+            if _token_config_deletion_lines:
+                try:
+                    _truncate_file(TOKEN_CONFIG_DELETIONS_FILE)
+                    _token_config_deletion_lines = 0
+                except Exception as e:
+                    logger.error(f"Failed to truncate {TOKEN_CONFIG_DELETIONS_FILE}: {str(e)}")
+
+
+def _flush_loop():
+    while True:
+        _dirty_event.wait()
+        time.sleep(_FLUSH_DELAY_SECONDS)
+        _dirty_event.clear()
+        try:
+            _flush_now()
+        except Exception as e:
+            logger.error(f"Failed to flush codex usage data: {str(e)}")
+
+
+def _append_codex_usage_log(keys):
+    """追加 {"k": token_key, "s": snapshot|null} 记录，日志过长时压缩回快照文件。"""
+    global _codex_usage_log_lines
+    usage = _usage()
+    _codex_usage_log_lines += len(keys)
+    if _codex_usage_compact_required or _codex_usage_log_lines > _USAGE_LOG_COMPACT_FACTOR * len(usage):
+        _compact_codex_usage_log(usage)
+        return
+    _ensure_data_dir()
+    payload = b"".join(
+        orjson.dumps({"k": key, "s": usage.get(key)}, option=orjson.OPT_APPEND_NEWLINE) for key in keys
+    )
+    with open(CODEX_USAGE_LOG_FILE, "ab") as f:
+        f.write(payload)
+
+
+def _compact_codex_usage_log(usage: Dict[str, Dict[str, Any]]):
+    global _codex_usage_log_lines, _codex_usage_compact_required
+    _persist_json_file(CODEX_USAGE_FILE, usage)
+    _truncate_file(CODEX_USAGE_LOG_FILE)
+    _codex_usage_log_lines = 0
+    _codex_usage_compact_required = False
+
+
+def _truncate_file(path: str):
+    with open(path, "wb"):
+        pass
+
+
+def _append_token_config_deletions(deletions: List[Tuple[str, float]]):
+    """追加 {"k": token_key, "t": 删除时间戳} 墓碑记录，累计过多时改为整体重写配置文件。"""
+    global _token_config_deletion_lines, _token_config_dirty
+    _token_config_deletion_lines += len(deletions)
+    if _token_config_deletion_lines >= _DELETION_LOG_COMPACT_LINES:
+        _token_config_dirty = True
+        return
+    _ensure_data_dir()
+    payload = b"".join(
+        orjson.dumps({"k": key, "t": deleted_at}, option=orjson.OPT_APPEND_NEWLINE) for key, deleted_at in deletions
+    )
+    with open(TOKEN_CONFIG_DELETIONS_FILE, "ab") as f:
+        f.write(payload)
+
+
+def _replay_token_config_deletions(configs: Dict[str, Any]) -> bool:
+    if not os.path.exists(TOKEN_CONFIG_DELETIONS_FILE):
+        return False
+    replayed = False
+    with open(TOKEN_CONFIG_DELETIONS_FILE, "rb") as f:
+        for line in f:
+            try:
+                record = orjson.loads(line)
+                key, deleted_at = record["k"], float(record["t"])
+            except Exception:
+                continue
+            cfg = configs.get(key)
+            if cfg is None:
+                continue
+            # 删除后又重新添加的配置不受旧墓碑影响
+            created_at = _parse_iso_datetime(cfg.get("created_at")) if isinstance(cfg, dict) else None
+            if created_at is None or created_at.timestamp() <= deleted_at:
+                del configs[key]
+                replayed = True
+    return replayed
+
+
+def _replay_codex_usage_log(usage: Dict[str, Dict[str, Any]]) -> bool:
+    if not os.path.exists(CODEX_USAGE_LOG_FILE):
+        return False
+    replayed = False
+    with open(CODEX_USAGE_LOG_FILE, "rb") as f:
+        for line in f:
+            try:
+                record = orjson.loads(line)
+                key, snapshot = record["k"], record.get("s")
+            except Exception:
+                continue
+            if isinstance(snapshot, dict):
+                usage[key] = snapshot
+            else:
+                usage.pop(key, None)
+            replayed = True
+    return replayed
+
+
+def _persist_codex_usage(token_key: str):
+    with _dirty_lock:
+        _codex_usage_dirty_keys.add(token_key)
+    _dirty_event.set()
+
+
+def _persist_token_config_deletion(token_key: str):
+    with _dirty_lock:
+        _token_config_deletions.append((token_key, time.time()))
+    _dirty_event.set()
 
 
 def _persist_token_config():
-    _persist_json_file(TOKEN_CONFIG_FILE, _token_config_map)
+    global _token_config_dirty
+    _token_config_dirty = True
+    _dirty_event.set()
+
 
+def _is_canonical_expires_at(value: Any) -> bool:
+    """是否已是 _normalize_expires_at 输出的 UTC isoformat 形式（形状匹配且能解析为合法日期）。"""
+    return (
+        isinstance(value, str)
+        and len(value) in (25, 32)
+        and value[10] == "T"
+        and value.endswith("+00:00")
+        and _parse_iso_datetime_text(value) is not None
+    )
 
-def _sanitize_token_config_map() -> bool:
+
+def _sanitize_token_config_map(configs: Dict[str, Any]) -> bool:
     changed = False
-    for key, cfg in list(_token_config_map.items()):
+    for key, cfg in list(configs.items()):
         if not isinstance(cfg, dict):
-            _token_config_map[key] = {
+            configs[key] = {
                 "name": "",
                 "full_token": "",
-                "created_at": datetime.now(timezone.utc).isoformat(),
+                "created_at": _now_iso(),
                 "expires_at": None,
             }
             changed = True
@@ -306,11 +558,13 @@ def _sanitize_token_config_map() -> bool:
             cfg["full_token"] = ""
             changed = True
         if "created_at" not in cfg:
-            cfg["created_at"] = datetime.now(timezone.utc).isoformat()
+            cfg["created_at"] = _now_iso()
             changed = True
         if "expires_at" not in cfg:
             cfg["expires_at"] = None
             changed = True
+        elif _is_canonical_expires_at(cfg["expires_at"]):
+            continue
         else:
             try:
                 normalized = _normalize_expires_at(cfg.get("expires_at")) if cfg.get("expires_at") is not None else None
@@ -323,8 +577,38 @@ def _sanitize_token_config_map() -> bool:
     return changed
 
 
-_ensure_data_dir()
-_codex_usage_map = _load_json_file(CODEX_USAGE_FILE)
-_token_config_map = _load_json_file(TOKEN_CONFIG_FILE)
-if _sanitize_token_config_map():
-    _persist_token_config()
+def _usage() -> Dict[str, Dict[str, Any]]:
+    global _codex_usage_map
+    if _codex_usage_map is None:
+        with _init_lock:
+            if _codex_usage_map is None:
+                _ensure_data_dir()
+                usage = _load_json_file(CODEX_USAGE_FILE)
+                if _replay_codex_usage_log(usage):
+                    _compact_codex_usage_log(usage)
+                _codex_usage_map = usage
+    return _codex_usage_map
+
+
+def _cfg() -> Dict[str, Dict[str, Any]]:
+    global _token_config_map
+    if _token_config_map is None:
+        with _init_lock:
+            if _token_config_map is None:
+                _ensure_data_dir()
+                configs = _load_json_file(TOKEN_CONFIG_FILE)
+                replayed = _replay_token_config_deletions(configs)
+                changed = _sanitize_token_config_map(configs)
+                if replayed:
+                    _persist_json_file(TOKEN_CONFIG_FILE, configs)
+                    _truncate_file(TOKEN_CONFIG_DELETIONS_FILE)
+                    changed = False
+                _rebuild_expires_at_epoch(configs)
+                _token_config_map = configs
+                if changed:
+                    _persist_token_config()
+    return _token_config_map
+
+
+threading.Thread(target=_flush_loop, name="codex-usage-flusher", daemon=True).start()
+atexit.register(_flush_now)
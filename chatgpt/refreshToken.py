@@ -45,10 +45,8 @@ async def chat_refresh(refresh_token):
             return access_token
         else:
             if "invalid_grant" in r.text or "access_denied" in r.text:
-                if refresh_token not in globals.error_token_list:
-                    globals.error_token_list.append(refresh_token)
-                    with open(globals.ERROR_TOKENS_FILE, "a", encoding="utf-8") as f:
-                        f.write(refresh_token + "\n")
+                if globals.add_runtime_error_token(refresh_token):
+                    globals.log_error_token("+", refresh_token)
                 raise Exception(r.text)
             else:
                 raise Exception(r.text[:300])
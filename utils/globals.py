@@ -1,3 +1,4 @@
+import asyncio
 import json
 import os
 
@@ -14,10 +15,14 @@ SEED_MAP_FILE = os.path.join(DATA_FOLDER, "seed_map.json")
 CONVERSATION_MAP_FILE = os.path.join(DATA_FOLDER, "conversation_map.json")
 CODEX_USAGE_FILE = os.path.join(DATA_FOLDER, "codex_usage.json")
 TOKEN_CONFIG_FILE = os.path.join(DATA_FOLDER, "token_config.json")
+ERROR_TOKENS_LOG_HEADER = "#error-token-log v1"
 
 count = 0
 token_list = []
-error_token_list = []
+error_token_list = {}  # insertion-ordered set: token -> None
+token_set = set()
+active_count = 0
+error_token_log_lines = 0
 refresh_map = {}
 wss_map = {}
 fp_map = {}
@@ -89,21 +94,143 @@ else:
 if os.path.exists(TOKENS_FILE):
     with open(TOKENS_FILE, "r", encoding="utf-8") as f:
         for line in f:
-            if line.strip() and not line.startswith("#"):
-                token_list.append(line.strip())
+            token = line.strip()
+            if token and not token.startswith("#"):
+                token_list.append(token)
 else:
     with open(TOKENS_FILE, "w", encoding="utf-8") as f:
         pass
 
 if os.path.exists(ERROR_TOKENS_FILE):
     with open(ERROR_TOKENS_FILE, "r", encoding="utf-8") as f:
+        # Append-only log after the header: "+token" adds, "-token" removes.
+        # Files without the header are legacy lists of bare tokens, which may themselves start with "-".
+        is_error_token_log = f.readline().strip() == ERROR_TOKENS_LOG_HEADER
+        if not is_error_token_log:
+            f.seek(0)
         for line in f:
-            if line.strip() and not line.startswith("#"):
-                error_token_list.append(line.strip())
+            token = line.strip()
+            if token and not token.startswith("#"):
+                error_token_log_lines += 1
+                if not is_error_token_log:
+                    error_token_list[token] = None
+                elif token[0] == "-":
+                    error_token_list.pop(token[1:], None)
+                elif token[0] == "+":
+                    error_token_list[token[1:]] = None
+    if not is_error_token_log:
+        with open(ERROR_TOKENS_FILE, "w", encoding="utf-8") as f:
+            f.write(ERROR_TOKENS_LOG_HEADER + "\n" + "".join("+" + token + "\n" for token in error_token_list))
+        error_token_log_lines = len(error_token_list)
 else:
     with open(ERROR_TOKENS_FILE, "w", encoding="utf-8") as f:
-        pass
+        f.write(ERROR_TOKENS_LOG_HEADER + "\n")
+
+token_set.update(token_list)
+active_count = len(token_set - error_token_list.keys())
 
 if token_list:
     logger.info(f"Token list count: {len(token_list)}, Error token list count: {len(error_token_list)}")
     logger.info("-" * 60)
+
+
+def active_tokens_count():
+    return active_count
+
+
+def add_runtime_tokens(tokens):
+    global active_count
+    token_list.extend(tokens)
+    for token in tokens:
+        if token not in token_set:
+            token_set.add(token)
+            if token not in error_token_list:
+                active_count += 1
+
+
+def add_runtime_error_token(token):
+    global active_count
+    if token in error_token_list:
+        return False
+    error_token_list[token] = None
+    if token in token_set:
+        active_count -= 1
+    return True
+
+
+def remove_runtime_error_token(token):
+    global active_count
+    if token not in error_token_list:
+        return False
+    del error_token_list[token]
+    if token in token_set:
+        active_count += 1
+    return True
+
+
+def clear_runtime_tokens():
+    global active_count
+    token_list.clear()
+    error_token_list.clear()
+    token_set.clear()
+    active_count = 0
+
+
+ERROR_LOG_COMPACT_FACTOR = 4
+_error_log_pending = []
+_error_log_flush_task = None
+_error_log_compact_required = False
+
+
+def write_text(path, text, mode):
+    with open(path, mode, encoding="utf-8") as f:
+        f.write(text)
+
+
+async def _write_error_log_pending():
+    global error_token_log_lines, _error_log_compact_required
+    lines = _error_log_pending[:]
+    _error_log_pending.clear()
+    log_lines = error_token_log_lines + len(lines)
+    try:
+        if _error_log_compact_required or log_lines > ERROR_LOG_COMPACT_FACTOR * len(error_token_list):
+            snapshot = ["+" + token + "\n" for token in error_token_list]
+            text = ERROR_TOKENS_LOG_HEADER + "\n" + "".join(snapshot)
+            await asyncio.to_thread(write_text, ERROR_TOKENS_FILE, text, "w")
+            error_token_log_lines = len(snapshot)
+            _error_log_compact_required = False
+        else:
+            await asyncio.to_thread(write_text, ERROR_TOKENS_FILE, "".join(lines), "a")
+            error_token_log_lines = log_lines
+    except Exception as e:
+        logger.error(f"Failed to persist error tokens: {str(e)}")
+        # Keep the records for the next flush; a failed write may leave a partial line, so rewrite the whole file.
+        _error_log_pending[:0] = lines
+        _error_log_compact_required = True
+        return False
+    return True
+
+
+async def _flush_error_log_later():
+    global _error_log_flush_task
+    try:
+        while _error_log_pending:
+            await asyncio.sleep(0.05)
+            if not await _write_error_log_pending():
+                break
+    finally:
+        _error_log_flush_task = None
+
+
+def log_error_token(op, token):
+    global _error_log_flush_task
+    _error_log_pending.append(op + token + "\n")
+    if _error_log_flush_task is None:
+        _error_log_flush_task = asyncio.create_task(_flush_error_log_later())
+
+
+async def flush_error_log():
+    if _error_log_flush_task is not None:
+        await _error_log_flush_task
+    if _error_log_pending:
+        await _write_error_log_pending()